@@ -1,7 +1,8 @@
 import argparse
-from contextlib import suppress
+from contextlib import suppress, contextmanager
 from ctypes import ArgumentError
 import asyncio
+import functools
 import gc
 import importlib
 import shutil
@@ -10,18 +11,23 @@ from typing import NamedTuple, List, Dict
 from enum import Enum
 import threading
 import traceback
-import appdirs
 from pathlib import Path
 import sys
-from datetime import datetime
 import os
+import re
 import time
 import signal
+import select
 import subprocess
 import uuid
-import jinja2
+import logging
 import drekar_launch_process
 
+_log = logging.getLogger("drekar_launch")
+
+# Use the libyaml parser when available
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 
 class DrekarTask(NamedTuple):
     name: str
@@ -61,64 +67,55 @@ class DrekarProcess:
         s = self.task_launch
         stdout_log_fname = self.log_dir.joinpath(f"{s.name}.log")
         stderr_log_fname = self.log_dir.joinpath(f"{s.name}.stderr.log")
-        with open(stdout_log_fname,"w") as stdout_log, open(stderr_log_fname,"w") as stderr_log:
+        with open(stdout_log_fname,"wb",buffering=65536) as stdout_log, open(stderr_log_fname,"wb",buffering=65536) as stderr_log, \
+                self._periodic_flush(stdout_log, stderr_log):
             if s.start_delay > 0:
-                stderr_log.write(f"Delaying starting {s.name} for {s.start_delay} seconds...\n")
+                stderr_log.write(f"Delaying starting {s.name} for {s.start_delay} seconds...\n".encode("utf-8"))
                 with suppress(asyncio.TimeoutError):
                     await asyncio.wait_for(self.parent.exit_event.wait(),timeout=s.start_delay)
                 if not self._keep_going:
                     return
+            name, program, args, env, cwd = s.name, s.program, s.args, s.environment, s.cwd
+            start_msg = f"Starting process {name}...\n".encode("utf-8")
+            started_msg = f"Process {name} started\n\n".encode("utf-8")
             while self._keep_going:
+                stdout_task = None
+                stderr_task = None
                 try:
-                    self.parent.process_state_changed(s.name,ProcessState.START_PENDING)
-                    stderr_log.write(f"Starting process {s.name}...\n")
-                    python_exe = sys.executable
-                    self._process = await create_subprocess_exec(s.program, s.args, s.environment, s.cwd, self.parent.cgroup)
+                    self.parent.process_state_changed(name,ProcessState.START_PENDING)
+                    stderr_log.write(start_msg)
+                    self._process = await create_subprocess_exec(program, args, env, cwd, self.parent.cgroup)
                     # print(f"process pid: {self._process.pid}")
-                    stderr_log.write(f"Process {s.name} started\n\n")                   
-                    self.parent.process_state_changed(s.name,ProcessState.RUNNING)
-                    stdout_read_task = asyncio.ensure_future(self._process.stdout.readline())
-                    stderr_read_task = asyncio.ensure_future(self._process.stderr.readline())
-                    while True: #self._keep_going:
-                        wait_tasks = list(filter(lambda x: x is not None, [stdout_read_task, stderr_read_task]))
-                        if len(wait_tasks) == 0:
-                            break
-                        done, pending = await asyncio.wait(wait_tasks,return_when=asyncio.FIRST_COMPLETED)
-                        if stderr_read_task in done:
-                            stderr_line = await stderr_read_task
-                            if len(stderr_line) == 0:
-                                stderr_read_task = None
-                            else:
-                                stderr_log.write(stderr_line.decode("utf-8")) 
-                                stderr_log.flush()
-                                stderr_read_task = asyncio.ensure_future(self._process.stderr.readline())
-                                if self.screen:
-                                    print(f"[{self.task_launch.name}]  " + stderr_line.decode("utf-8"),end="",file=sys.stderr)
-                        if stdout_read_task in done:
-                            stdout_line = await stdout_read_task
-                            if len(stdout_line) == 0:
-                                stdout_read_task = None
-                            else:
-                                stdout_log.write(stdout_line.decode("utf-8"))
-                                stdout_log.flush()
-                                stdout_read_task = asyncio.ensure_future(self._process.stdout.readline())
-                                if self.screen:
-                                    print(f"[{self.task_launch.name}]  " + stdout_line.decode("utf-8"),end="",file=sys.stdout)
-                        if stdout_read_task is None and stderr_read_task is None:
-                            break
-                    await self._process.wait()
+                    stderr_log.write(started_msg)
+                    self.parent.process_state_changed(name,ProcessState.RUNNING)
+                    stdout_task = asyncio.create_task(self._pump_stream(self._process.stdout, stdout_log, sys.stdout))
+                    stderr_task = asyncio.create_task(self._pump_stream(self._process.stderr, stderr_log, sys.stderr))
+                    await asyncio.gather(stdout_task, stderr_task, self._process.wait())
                     self.exit_status = self._process.get_exit_status()
                     if self.exit_status != 0:
-                        stderr_log.write(f"Process {s.name} exited with status {self.exit_status}\n")
+                        stderr_log.write(f"Process {name} exited with status {self.exit_status}\n".encode("utf-8"))
                         if self.screen:
-                            print(f"[{self.task_launch.name}]  Process {s.name} exited with status {self.exit_status}",file=sys.stderr)
-                    self.parent.process_state_changed(s.name,ProcessState.STOPPED)
+                            print(f"[{name}]  Process {name} exited with status {self.exit_status}",file=sys.stderr)
+                    self._flush_logs(stdout_log, stderr_log)
+                    self.parent.process_state_changed(name,ProcessState.STOPPED)
+                except asyncio.CancelledError:
+                    self._process = None
+                    self.parent.process_state_changed(name,ProcessState.STOPPED)
+                    raise
                 except:
                     self._process = None
-                    self.parent.process_state_changed(s.name,ProcessState.STOPPED)
-                    traceback.print_exc()
-                    stderr_log.write(f"\nProcess {s.name} error:\n")
-                    stderr_log.write(traceback.format_exc())
+                    _log.exception("Process %s error", name)
+                    stderr_log.write(f"\nProcess {name} error:\n".encode("utf-8"))
+                    # Write the traceback a frame at a time instead of building the whole string
+                    for tb_line in traceback.TracebackException(*sys.exc_info()).format():
+                        stderr_log.write(tb_line.encode("utf-8"))
+                    self._flush_logs(stdout_log, stderr_log)
+                    self.parent.process_state_changed(name,ProcessState.STOPPED)
+                finally:
+                    # Don't leave the output pumps running if the wait was interrupted
+                    for t in (stdout_task, stderr_task):
+                        if t is not None and not t.done():
+                            t.cancel()
                 self._process = None
                 if s.quit_on_terminate:
                     self.parent.exit_event.set()
@@ -129,6 +126,64 @@ class DrekarProcess:
                     with suppress(asyncio.TimeoutError):
                         await asyncio.wait_for(self.parent.exit_event.wait(), timeout=s.restart_backoff)
 
+    async def _pump_stream(self, stream, log_file, screen_out):
+        # Each stream is drained by its own task, reading large chunks instead of line by line
+        prefix = f"[{self.task_launch.name}]  ".encode("utf-8")
+        screen = self.screen and screen_out is not None
+        screen_buffer = getattr(screen_out, "buffer", None)
+        tail = b""
+        while True:
+            chunk = await stream.read(65536)
+            if len(chunk) == 0:
+                break
+            log_file.write(chunk)
+            if screen:
+                # Only echo complete lines so output from concurrent tasks does not interleave
+                # mid-line. The unfinished tail is kept until its "\n" arrives
+                data = tail + chunk if tail else chunk
+                end = data.rfind(b"\n") + 1
+                tail = data[end:]
+                if end > 0:
+                    lines = data[:end - 1].replace(b"\n", b"\n" + prefix)
+                    self._write_screen(screen_out, screen_buffer, prefix + lines + b"\n")
+                if len(tail) >= 65536:
+                    # Don't hold on to very long unterminated lines
+                    self._write_screen(screen_out, screen_buffer, prefix + tail + b"\n")
+                    tail = b""
+        if screen and tail:
+            self._write_screen(screen_out, screen_buffer, prefix + tail)
+
+    @staticmethod
+    def _write_screen(screen_out, screen_buffer, screen_data):
+        # Keep output as bytes and write it to the screen in one call
+        screen_out.flush()
+        if screen_buffer is not None:
+            screen_buffer.write(screen_data)
+            screen_buffer.flush()
+        else:
+            screen_out.write(screen_data.decode("utf-8", errors="replace"))
+            screen_out.flush()
+
+    @contextmanager
+    def _periodic_flush(self, *log_files):
+        # Flush buffered logs on a timer instead of after every write
+        handle = None
+        def flush_timer():
+            nonlocal handle
+            self._flush_logs(*log_files)
+            handle = self.loop.call_later(0.5, flush_timer)
+        handle = self.loop.call_later(0.5, flush_timer)
+        try:
+            yield
+        finally:
+            handle.cancel()
+
+    @staticmethod
+    def _flush_logs(*log_files):
+        for f in log_files:
+            with suppress(Exception):
+                f.flush()
+
     @property
     def process_state(self):
         pass
@@ -150,22 +205,24 @@ class DrekarProcess:
         try:
             self._process.kill()
         except:
-            traceback.print_exc()
+            _log.exception("Error killing process %s", self.task_launch.name)
 
+# DrekarCore is not thread safe. All methods must be called on the event loop thread,
+# other threads hand off with loop.call_soon_threadsafe
 class DrekarCore:
     def __init__(self, name, task_launches, exit_event, log_dir, screen, loop):
         self.name = name
-        self.task_launches = dict()
+        self.task_launches = {s.name: s for s in task_launches}
         self._closed = False
-        for s in task_launches:
-            self.task_launches[s.name] = s
         self.log_dir = log_dir
         self.loop = loop
         self.screen=screen
 
         self._subprocesses = dict()
-        self._lock = threading.RLock()
+        self._running = set()
         self.exit_event = exit_event
+        self._stopped_event = asyncio.Event()
+        self._stopped_event.set()
         self.cgroup = None
 
         if sys.platform == "linux":
@@ -179,82 +236,66 @@ class DrekarCore:
         self.loop.create_task(p.run())
 
     def start_all(self):
-        with self._lock:
-            for name,s in self.task_launches.items():
-                if name not in self._subprocesses:
-                    self._do_start(s)
-
-    def start(self, name):
-        with self._lock:
-            if self._closed:
-                assert False, "Already closed"
-            try:
-                s = self.task_launches[name]
-            except KeyError:
-                raise ArgumentError(f"Invalid service requested: {name}")
+        for name,s in self.task_launches.items():
             if name not in self._subprocesses:
                 self._do_start(s)
 
+    def start(self, name):
+        if self._closed:
+            assert False, "Already closed"
+        try:
+            s = self.task_launches[name]
+        except KeyError:
+            raise ArgumentError(f"Invalid service requested: {name}")
+        if name not in self._subprocesses:
+            self._do_start(s)
+
     def process_state_changed(self, process_name, state):
         print(f"Process changed {process_name} {state}")
-        if self._closed:
-            if state == ProcessState.STOPPED:
-                with self._lock:
-                    if process_name in self._subprocesses:
-                        del self._subprocesses[process_name]
+        if state == ProcessState.RUNNING:
+            self._running.add(process_name)
+            self._stopped_event.clear()
+        elif state == ProcessState.STOPPED:
+            self._running.discard(process_name)
+            if not self._running:
+                self._stopped_event.set()
+            if self._closed:
+                self._subprocesses.pop(process_name, None)
 
     def check_deps_status(self, deps):
         return True
 
     def stop_all(self):
-        with self._lock:
-            if self._closed:
-                return
-            self._closed = True
+        if self._closed:
+            return
+        self._closed = True
 
-            for p in self._subprocesses.values():
-                try:
-                    p.close()
-                except Exception:
-                    traceback.print_exc()
-                    pass
+        for p in self._subprocesses.values():
+            try:
+                p.close()
+            except Exception:
+                _log.exception("Error closing process %s", p.task_launch.name)
+                pass
 
     async def wait_all_stopped(self):
         try:
-            t1 = time.time()
-            t_last_sent_close = 0
-            while True:
-                t_diff = time.time() - t1
-                if t_diff > 15:
-                    break
-                running_count = 0
-                with self._lock:
-                    for p in self._subprocesses.values():
-                        if not p.stopped:
-                            running_count += 1
-                if running_count == 0:
-                    break
-                await asyncio.sleep(0.1)
-                if t_diff > t_last_sent_close + 1:
-                    t_last_sent_close = t_diff
-                    with self._lock:
-                        for p in self._subprocesses.values():
-                            if not p.stopped:
-                                try:
-                                    p.close()
-                                except Exception:
-                                    traceback.print_exc()
-                                    pass
-            
+            # Resend close requests once a second until all processes have stopped
+            self._nudge_handle = self.loop.call_later(1, self._nudge_close)
+            try:
+                await asyncio.wait_for(self._stopped_event.wait(), timeout=15)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._nudge_handle.cancel()
+
             running_count = 0
-            with self._lock:
-                for p in self._subprocesses.values():
-                    if not p.stopped:
-                        running_count += 1
-                        try:
-                            p.kill()
-                        except Exception:
-                            traceback.print_exc()
+            for p in self._subprocesses.values():
+                if not p.stopped:
+                    running_count += 1
+                    try:
+                        p.kill()
+                    except Exception:
+                        _log.exception("Error killing process %s", p.task_launch.name)
                         
             if running_count != 0:
                 print("Sending processes still running SIGKILL")                
@@ -262,14 +303,22 @@ class DrekarCore:
 
             #self._loop.stop()
         except:
-            traceback.print_exc()
+            _log.exception("Error waiting for processes to stop")
+
+    def _nudge_close(self):
+        for p in list(self._subprocesses.values()):
+            if not p.stopped:
+                try:
+                    p.close()
+                except Exception:
+                    _log.exception("Error closing process %s", p.task_launch.name)
+        self._nudge_handle = self.loop.call_later(1, self._nudge_close)
 
     def get_exit_status(self):
         exit_status = 0
-        with self._lock:
-            for p in self._subprocesses.values():
-                if p.exit_status != 0:
-                    exit_status = p.exit_status
+        for p in self._subprocesses.values():
+            if p.exit_status != 0:
+                exit_status = p.exit_status
         return exit_status
     
     def close(self):
@@ -292,7 +341,7 @@ async def create_subprocess_exec(process, args, env, cwd, launcher_cgroup=None):
         return DrekarSubprocessImpl(process,job_handle)
 
     else:
-        #TODO: Use "start_new_session=True" arg for new process
+        # start_new_session instead of preexec_fn=os.setsid keeps the vfork fast path open
         process = await asyncio.create_subprocess_exec(process,*args, \
             stdout=asyncio.subprocess.PIPE,stderr=asyncio.subprocess.PIPE,\
             env=env, cwd=cwd, close_fds=True, start_new_session=True )
@@ -325,11 +374,25 @@ class DrekarSubprocessImpl:
     def pid(self):
         return self._process.pid
 
+    if sys.platform != "win32":
+        _term_signals = (signal.SIGINT, signal.SIGTERM, signal.SIGKILL)
+
+    @property
+    def pgid(self):
+        # Tasks are started in a new session, so the process group id is the task pid
+        return self._process.pid
+
     def wait(self):
         return self._process.wait()
 
     def kill(self):
-        self._process.kill()
+        if sys.platform == "win32":
+            self._process.kill()
+        else:
+            try:
+                os.killpg(self.pgid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
 
     def send_term(self, attempt_count):
         if sys.platform == "win32":
@@ -338,10 +401,13 @@ class DrekarSubprocessImpl:
             else:
                 subprocess_impl_win32.win32_send_job_wm_close(self._job_handle)
         else:
-            import signal
-            pid = self._process.pid
-            pgid = os.getpgid(pid)
-            os.killpg(pgid, signal.SIGINT)
+            # close() is resent about once a second, escalate to SIGTERM after 5 attempts
+            # and SIGKILL after 10
+            sig = self._term_signals[min(attempt_count // 5, 2)]
+            try:
+                os.killpg(self.pgid, sig)
+            except ProcessLookupError:
+                pass
 
     def close(self):
         if sys.platform == "win32":            
@@ -402,15 +468,54 @@ if sys.platform == "win32":
             ("dwFlags", ctypes.c_ulong)
         ]
 
-    class _JOBOBJECT_BASIC_PROCESS_ID_LIST(ctypes.Structure):
-        _fields_ = [
-            ("NumberOfAssignedProcesses", ctypes.wintypes.DWORD),
-            ("NumberOfProcessIdsInList", ctypes.wintypes.DWORD),
-            ("ProcessIdList", ctypes.c_size_t*16384)
-        ]
+    @functools.lru_cache(maxsize=None)
+    def _job_pid_list_type(count):
+        # ProcessIdList is variable length, so create a structure type for the requested count
+        class _JOBOBJECT_BASIC_PROCESS_ID_LIST_N(ctypes.Structure):
+            _fields_ = [
+                ("NumberOfAssignedProcesses", ctypes.wintypes.DWORD),
+                ("NumberOfProcessIdsInList", ctypes.wintypes.DWORD),
+                ("ProcessIdList", ctypes.c_size_t*count)
+            ]
+        return _JOBOBJECT_BASIC_PROCESS_ID_LIST_N
+
+    _WNDENUMPROC = ctypes.WINFUNCTYPE(ctypes.wintypes.BOOL,ctypes.wintypes.HWND,ctypes.wintypes.LPARAM)
+
+    # Bind the win32 functions once with explicit prototypes. Private WinDLL instances are used
+    # so the prototypes do not affect other users of ctypes.windll
+    _kernel32 = ctypes.WinDLL("kernel32")
+    _user32 = ctypes.WinDLL("user32")
+    _ntdll = ctypes.WinDLL("ntdll")
+
+    def _win32_func(dll, name, restype, argtypes):
+        f = getattr(dll, name)
+        f.restype = restype
+        f.argtypes = argtypes
+        return f
+
+    _CreateJobObjectW = _win32_func(_kernel32, "CreateJobObjectW", ctypes.wintypes.HANDLE, [ctypes.c_void_p, ctypes.wintypes.LPCWSTR])
+    _QueryInformationJobObject = _win32_func(_kernel32, "QueryInformationJobObject", ctypes.wintypes.BOOL,
+        [ctypes.wintypes.HANDLE, ctypes.c_int, ctypes.c_void_p, ctypes.wintypes.DWORD, ctypes.POINTER(ctypes.wintypes.DWORD)])
+    _SetInformationJobObject = _win32_func(_kernel32, "SetInformationJobObject", ctypes.wintypes.BOOL,
+        [ctypes.wintypes.HANDLE, ctypes.c_int, ctypes.c_void_p, ctypes.wintypes.DWORD])
+    _OpenProcess = _win32_func(_kernel32, "OpenProcess", ctypes.wintypes.HANDLE, [ctypes.wintypes.DWORD, ctypes.wintypes.BOOL, ctypes.wintypes.DWORD])
+    _AssignProcessToJobObject = _win32_func(_kernel32, "AssignProcessToJobObject", ctypes.wintypes.BOOL, [ctypes.wintypes.HANDLE, ctypes.wintypes.HANDLE])
+    _CloseHandle = _win32_func(_kernel32, "CloseHandle", ctypes.wintypes.BOOL, [ctypes.wintypes.HANDLE])
+    _CreateToolhelp32Snapshot = _win32_func(_kernel32, "CreateToolhelp32Snapshot", ctypes.wintypes.HANDLE, [ctypes.wintypes.DWORD, ctypes.wintypes.DWORD])
+    _Thread32First = _win32_func(_kernel32, "Thread32First", ctypes.wintypes.BOOL, [ctypes.wintypes.HANDLE, ctypes.POINTER(_THREADENTRY32)])
+    _Thread32Next = _win32_func(_kernel32, "Thread32Next", ctypes.wintypes.BOOL, [ctypes.wintypes.HANDLE, ctypes.POINTER(_THREADENTRY32)])
+    _NtResumeProcess = _win32_func(_ntdll, "NtResumeProcess", ctypes.wintypes.LONG, [ctypes.wintypes.HANDLE])
+    _GenerateConsoleCtrlEvent = _win32_func(_kernel32, "GenerateConsoleCtrlEvent", ctypes.wintypes.BOOL, [ctypes.wintypes.DWORD, ctypes.wintypes.DWORD])
+    _EnumThreadWindows = _win32_func(_user32, "EnumThreadWindows", ctypes.wintypes.BOOL, [ctypes.wintypes.DWORD, _WNDENUMPROC, ctypes.wintypes.LPARAM])
+    _GetAncestor = _win32_func(_user32, "GetAncestor", ctypes.wintypes.HWND, [ctypes.wintypes.HWND, ctypes.wintypes.UINT])
+    _GetDesktopWindow = _win32_func(_user32, "GetDesktopWindow", ctypes.wintypes.HWND, [])
+    _GetParent = _win32_func(_user32, "GetParent", ctypes.wintypes.HWND, [ctypes.wintypes.HWND])
+    _PostMessageW = _win32_func(_user32, "PostMessageW", ctypes.wintypes.BOOL,
+        [ctypes.wintypes.HWND, ctypes.wintypes.UINT, ctypes.wintypes.WPARAM, ctypes.wintypes.LPARAM])
+
     class subprocess_impl_win32:
         
-        WNDENUMPROC = ctypes.WINFUNCTYPE(ctypes.wintypes.BOOL,ctypes.wintypes.HWND,ctypes.wintypes.LPARAM)
+        WNDENUMPROC = _WNDENUMPROC
 
 
         JobObjectBasicLimitInformation = 2
@@ -419,21 +524,21 @@ if sys.platform == "win32":
         JOB_OBJECT_LIMIT_KILL_ON_JOB_CLOSE = 0x00002000
         PROCESS_SET_QUOTA = 0x0100
         PROCESS_TERMINATE = 0x0001
+        PROCESS_SUSPEND_RESUME = 0x0800
         CREATE_SUSPENDED = 0x00000004
 
         TH32CS_SNAPTHREAD = 0x00000004
-        THREAD_SUSPEND_RESUME = 0x0002
 
-        HWND_MESSAGE = ctypes.wintypes.HWND(-3)
+        GA_PARENT = 1
         WM_CLOSE = 16
 
         def win32_create_job_object():
-            job = ctypes.windll.kernel32.CreateJobObjectW(None, None)
+            job = _CreateJobObjectW(None, None)
             job_limits = _JOBOBJECT_EXTENDED_LIMIT_INFORMATION()
-            res = ctypes.windll.kernel32.QueryInformationJobObject(job, subprocess_impl_win32.JobObjectExtendedLimitInformation, ctypes.pointer(job_limits), ctypes.sizeof(job_limits), None)
+            res = _QueryInformationJobObject(job, subprocess_impl_win32.JobObjectExtendedLimitInformation, ctypes.pointer(job_limits), ctypes.sizeof(job_limits), None)
             assert "Internal error, could not query win32 job object information"
             job_limits.BasicLimitInformation.LimitFlags |= subprocess_impl_win32.JOB_OBJECT_LIMIT_KILL_ON_JOB_CLOSE
-            res = ctypes.windll.kernel32.SetInformationJobObject(job, subprocess_impl_win32.JobObjectExtendedLimitInformation, ctypes.pointer(job_limits), ctypes.sizeof(job_limits))
+            res = _SetInformationJobObject(job, subprocess_impl_win32.JobObjectExtendedLimitInformation, ctypes.pointer(job_limits), ctypes.sizeof(job_limits))
             assert res, "Internal error, could not set win32 job object information"
             #current_process = ctypes.windll.kernel32.OpenProcess(PROCESS_SET_QUOTA | PROCESS_TERMINATE, False, ctypes.windll.kernel32.GetCurrentProcessId())
             #res = ctypes.windll.kernel32.AssignProcessToJobObject(job, current_process)
@@ -442,55 +547,70 @@ if sys.platform == "win32":
 
         def win32_attach_job_and_resume_process(asyncio_process, job):
             
-            h = ctypes.windll.kernel32.OpenProcess(subprocess_impl_win32.PROCESS_SET_QUOTA | subprocess_impl_win32.PROCESS_TERMINATE, False, asyncio_process.pid)
-            res = ctypes.windll.kernel32.AssignProcessToJobObject(job, h)
+            h = _OpenProcess(subprocess_impl_win32.PROCESS_SET_QUOTA | subprocess_impl_win32.PROCESS_TERMINATE, False, asyncio_process.pid)
+            res = _AssignProcessToJobObject(job, h)
             assert res, "Internal error, could not assign win32 process to job"
-            ctypes.windll.kernel32.CloseHandle(h)
+            _CloseHandle(h)
 
             subprocess_impl_win32.win32_resume_process(asyncio_process.pid)
 
         def win32_close_job_object(handle):
             if handle is None:
                 return
-            ctypes.windll.kernel32.CloseHandle(handle)
+            _CloseHandle(handle)
 
-        def win32_get_thread_ids(pid):
+        def _win32_get_thread_owners(pids):
+            # Returns (owner pid, thread id) for the threads of all requested processes from one snapshot
+            pids = set(pids)
+            thread_owners = []
 
-            thread_ids = []
-
-            hThreadSnap = ctypes.windll.kernel32.CreateToolhelp32Snapshot(subprocess_impl_win32.TH32CS_SNAPTHREAD, pid)
+            hThreadSnap = _CreateToolhelp32Snapshot(subprocess_impl_win32.TH32CS_SNAPTHREAD, 0)
             try:
                 te32 = _THREADENTRY32()
                 te32.dwSize = ctypes.sizeof(_THREADENTRY32)
-                if ctypes.windll.kernel32.Thread32First(hThreadSnap, ctypes.byref(te32)) == 0:
+                if _Thread32First(hThreadSnap, ctypes.byref(te32)) == 0:
                     pass
 
                 else:
                     while True:
-                        if pid == te32.th32OwnerProcessID:
-                            thread_ids.append(te32.th32ThreadID)
+                        if te32.th32OwnerProcessID in pids:
+                            thread_owners.append((te32.th32OwnerProcessID, te32.th32ThreadID))
 
-                        if ctypes.windll.kernel32.Thread32Next(hThreadSnap, ctypes.byref(te32)) == 0:
+                        if _Thread32Next(hThreadSnap, ctypes.byref(te32)) == 0:
                             break
             finally:
-                ctypes.windll.kernel32.CloseHandle(hThreadSnap)
-            return sorted(thread_ids)
+                _CloseHandle(hThreadSnap)
+            return thread_owners
 
         def win32_resume_process(pid):
-            thread_ids = subprocess_impl_win32.win32_get_thread_ids(pid)
-            for thread_id in thread_ids:
-                thread_h = ctypes.windll.kernel32.OpenThread(subprocess_impl_win32.THREAD_SUSPEND_RESUME, False, thread_id)
-                ctypes.windll.kernel32.ResumeThread(thread_h)
-                ctypes.windll.kernel32.CloseHandle(thread_h)
+            # Resume all threads of the process in one call instead of walking a system wide thread snapshot
+            h = _OpenProcess(subprocess_impl_win32.PROCESS_SUSPEND_RESUME, False, pid)
+            assert h, "Internal error, could not open win32 process to resume"
+            try:
+                _NtResumeProcess(h)
+            finally:
+                _CloseHandle(h)
+
+        _pid_list_buf = None
 
         def win32_send_job_wm_close(job):
-            win32_thread_info = _JOBOBJECT_BASIC_PROCESS_ID_LIST()
-            res = ctypes.windll.kernel32.QueryInformationJobObject(job, subprocess_impl_win32.JobObjectBasicProcessIdList, ctypes.pointer(win32_thread_info), ctypes.sizeof(win32_thread_info), None)
-            if not res:
-                return
-            pids = []
-            for i in range(win32_thread_info.NumberOfProcessIdsInList):
-                pids.append(win32_thread_info.ProcessIdList[i])
+            # Reuse the pid list buffer between calls, starting small and only growing it
+            # if the job has more processes
+            win32_thread_info = subprocess_impl_win32._pid_list_buf
+            if win32_thread_info is None:
+                win32_thread_info = _job_pid_list_type(64)()
+                subprocess_impl_win32._pid_list_buf = win32_thread_info
+            while True:
+                win32_thread_info.NumberOfAssignedProcesses = 0
+                win32_thread_info.NumberOfProcessIdsInList = 0
+                res = _QueryInformationJobObject(job, subprocess_impl_win32.JobObjectBasicProcessIdList, ctypes.pointer(win32_thread_info), ctypes.sizeof(win32_thread_info), None)
+                if res:
+                    break
+                if win32_thread_info.NumberOfAssignedProcesses <= len(win32_thread_info.ProcessIdList):
+                    return
+                win32_thread_info = _job_pid_list_type(win32_thread_info.NumberOfAssignedProcesses + 16)()
+                subprocess_impl_win32._pid_list_buf = win32_thread_info
+            pids = win32_thread_info.ProcessIdList[:win32_thread_info.NumberOfProcessIdsInList]
 
             subprocess_impl_win32.win32_send_pid_wm_close(pids)
 
@@ -499,72 +619,66 @@ if sys.platform == "win32":
             subprocess_impl_win32._win32_send_ctrl_c_event(pid)
 
         
-        def _win32_find_message_hwnds(pids):
-            if not isinstance(pids, list):
-                pids = [pids]
-            hWnd_child_after = 0
-            hwnds = []
-
-            while True:
-                hWnd = ctypes.windll.user32.FindWindowExW(subprocess_impl_win32.HWND_MESSAGE, hWnd_child_after, None, None)
-                # print(hWnd)    
-                if hWnd == 0:
-                    break
-                process_id = ctypes.wintypes.DWORD()
-                ctypes.windll.user32.GetWindowThreadProcessId(hWnd,ctypes.byref(process_id))
-                if process_id.value in pids:
-                    hwnds.append(hWnd)
-                    #ctypes.windll.user32.PostMessageW(hWnd,subprocess_impl_win32.WM_CLOSE,0,0)
-                hWnd_child_after = hWnd
-            return hwnds
-        
-        def _win32_find_main_hwnds(pids):
-            if not isinstance(pids, list):
-                pids = [pids]
-
+        def _win32_find_process_hwnds(pid):
+            # Build a pid -> (main windows, message-only windows) map in one pass over the process
+            # threads, instead of scanning every window in the session for each process
+            pids = pid if isinstance(pid, list) else [pid]
+            process_hwnds = {p: ([], []) for p in pids}
             hwnds = []
 
-            # Create list of top level windows
-            
             def worker(hWnd, lParam):
-                process_id = ctypes.wintypes.DWORD()
-                ctypes.windll.user32.GetWindowThreadProcessId(hWnd,ctypes.byref(process_id))
-                if lParam == process_id.value:
-                    hwnds.append(hWnd)
+                hwnds.append(hWnd)
                 return True
-            
+
             cb_worker = subprocess_impl_win32.WNDENUMPROC(worker)
-            if not ctypes.windll.user32.EnumWindows(cb_worker, pids[0]):
-                return hwnds
-            
-            # Filter out windows that are children of other windows
-            hwnds = [hWnd for hWnd in hwnds if not ctypes.windll.user32.GetParent(hWnd)]
-            return hwnds
-        
+            desktop_hwnd = _GetDesktopWindow()
+            for owner_pid, thread_id in subprocess_impl_win32._win32_get_thread_owners(pids):
+                hwnds.clear()
+                _EnumThreadWindows(thread_id, cb_worker, 0)
+                main_hwnds, message_hwnds = process_hwnds[owner_pid]
+                for hWnd in hwnds:
+                    if _GetAncestor(hWnd, subprocess_impl_win32.GA_PARENT) == desktop_hwnd:
+                        # Filter out windows that are owned by other windows
+                        if not _GetParent(hWnd):
+                            main_hwnds.append(hWnd)
+                    else:
+                        message_hwnds.append(hWnd)
+            return process_hwnds
+
         def _win32_send_wm_close_hwnd_message(pid):
-            # check for main window first, then send to message windows
-            hwnds = subprocess_impl_win32._win32_find_main_hwnds(pid)
-            if not hwnds:
-                hwnds = subprocess_impl_win32._win32_find_message_hwnds(pid)
-            for hWnd in hwnds:
-                ctypes.windll.user32.PostMessageW(hWnd,subprocess_impl_win32.WM_CLOSE,0,0)
+            # check for main window first, then send to message windows, per process
+            for main_hwnds, message_hwnds in subprocess_impl_win32._win32_find_process_hwnds(pid).values():
+                hwnds = main_hwnds if main_hwnds else message_hwnds
+                for hWnd in hwnds:
+                    _PostMessageW(hWnd,subprocess_impl_win32.WM_CLOSE,0,0)
 
         def _win32_send_ctrl_c_event(pid):
             if isinstance(pid, list):
                 for p in pid:
                     subprocess_impl_win32._win32_send_ctrl_c_event(p)
                 return
-            ctypes.windll.kernel32.GenerateConsoleCtrlEvent(0,pid)
+            _GenerateConsoleCtrlEvent(0,pid)
 
 if sys.platform == "linux":
 
+    def _cgroup_write(path, value):
+        # cgroup control files take a single small write, so skip the buffered text io stack
+        fd = os.open(path, os.O_WRONLY)
+        try:
+            os.write(fd, value)
+        finally:
+            os.close(fd)
+
     class _linux_cgroupv2_launch_scope:
 
-        @staticmethod
-        def cgroupv2_supported():
-            if Path("/sys/fs/cgroup/cgroup.controllers").exists():
-                return True
-            return False
+        _cgroupv2_supported = None
+
+        @classmethod
+        def cgroupv2_supported(cls):
+            # Support cannot change while running, so only check once
+            if cls._cgroupv2_supported is None:
+                cls._cgroupv2_supported = Path("/sys/fs/cgroup/cgroup.controllers").exists()
+            return cls._cgroupv2_supported
 
         def __init__(self):
             self._pid = os.getpid()
@@ -583,18 +697,28 @@ if sys.platform == "linux":
             cgroup_path = None
             try:
                 # read cgroup path from /proc/{pid}/cgroup
-                with open(f"/proc/{pid}/cgroup","r") as f:
-                    for line in f:
-                        if line.startswith("0::/"):
-                            path1 = line.split(":")[2]
-                            if path1.strip() == "/":
-                                # Not currently assigned to a cgroup
-                                break
-                            cgroup_path = Path("/sys/fs/cgroup") / Path(path1.strip().strip("/"))
-                            break
+                fd = os.open(f"/proc/{pid}/cgroup", os.O_RDONLY)
+                try:
+                    data = os.read(fd, 4096)
+                finally:
+                    os.close(fd)
+                # find the cgroup v2 entry, which starts with "0::/"
+                if data.startswith(b"0::/"):
+                    i = 0
+                else:
+                    i = data.find(b"\n0::/")
+                    if i >= 0:
+                        i += 1
+                if i >= 0:
+                    end = data.find(b"\n", i)
+                    if end < 0:
+                        end = len(data)
+                    path1 = data[i+4:end].decode().strip().strip("/")
+                    # Empty path means not currently assigned to a cgroup
+                    if path1:
+                        cgroup_path = Path("/sys/fs/cgroup/" + path1)
             except:
-                # TODO: log error
-                traceback.print_exc()
+                _log.exception("Error reading cgroup of process %s", pid)
                 pass
 
             return cgroup_path
@@ -616,7 +740,7 @@ if sys.platform == "linux":
                 if enable_sentinel_environ == "1" or enable_sentinel_environ == "true":
                     self.start_sentinel()
             except:
-                traceback.print_exc()
+                _log.exception("Error creating launcher cgroup")
                 pass
 
         def create_task_cgroup(self, task_pid):
@@ -628,22 +752,34 @@ if sys.platform == "linux":
             task_cgroup.create_task_cgroup()
             return task_cgroup
         
+        @staticmethod
+        def wait_cgroup_empty(cgroup_path, timeout=1):
+            # cgroup.events reports "populated 0" once all processes in the subtree have exited
+            events_path = cgroup_path / "cgroup.events"
+            t_end = time.time() + timeout
+            while True:
+                with open(events_path, "rb") as f:
+                    if b"populated 0" in f.read():
+                        return
+                if time.time() > t_end:
+                    return
+                time.sleep(0.01)
+
         @staticmethod
         def close_cgroup_path(cgroup_path):
             try:
-                #Iterate through all subdirectories and recursively close them
-                for subpath in cgroup_path.iterdir():
-                    if subpath.is_dir():
-                        _linux_cgroupv2_launch_scope.close_cgroup_path(subpath)
+                # cgroup.kill is recursive, so one write kills every process in the subtree
                 cgroup_kill_path = cgroup_path / "cgroup.kill"
                 if cgroup_kill_path.exists():
-                    with open(cgroup_kill_path,"w") as f:
-                        f.write("1")
-                    pass
-                    time.sleep(0.1)
+                    _cgroup_write(cgroup_kill_path, b"1")
+                    _linux_cgroupv2_launch_scope.wait_cgroup_empty(cgroup_path)
+                # Remove all subdirectories depth first
+                for dirpath, dirnames, _ in os.walk(cgroup_path, topdown=False):
+                    for dirname in dirnames:
+                        os.rmdir(os.path.join(dirpath, dirname))
                 cgroup_path.rmdir()
             except:
-                traceback.print_exc()
+                _log.exception("Error closing cgroup %s", cgroup_path)
                 pass
 
         def close(self):
@@ -661,10 +797,8 @@ if sys.platform == "linux":
             if self.sentinel_process is not None:
                 return
             
-            sentinel_environ = os.environ.copy()
-            sentinel_environ["DREKAR_LAUNCH_ENABLE_SENTINEL"] = "0"
             self.sentinel_process=subprocess.Popen([sys.executable, "-m", "drekar_launch", "--sentinel", str(os.getpid()), str(self.cgroup_path)], 
-                                                    env=sentinel_environ, close_fds=True, start_new_session=True)
+                                                    env={**os.environ, "DREKAR_LAUNCH_ENABLE_SENTINEL": "0"}, close_fds=True, start_new_session=True)
             
         def stop_sentinel(self):
             if self.sentinel_process is None:
@@ -696,15 +830,13 @@ if sys.platform == "linux":
             self.task_cgroup_path = self.cgroup_path / f"{self.task_name}.scope"
             self.task_cgroup_path.mkdir()
             # Move task to new cgroup
-            with open(self.task_cgroup_path / "cgroup.procs","w") as f:
-                f.write(str(self.task_pid))
+            _cgroup_write(self.task_cgroup_path / "cgroup.procs", str(self.task_pid).encode())
             
         def close(self):
             if self.task_cgroup_path is not None:
                 task_cgroup_kill_path = self.task_cgroup_path / "cgroup.kill"
                 if task_cgroup_kill_path.exists():
-                    with open(task_cgroup_kill_path,"w") as f:
-                        f.write("1")
+                    _cgroup_write(task_cgroup_kill_path, b"1")
                     pass
                 self.task_cgroup_path.rmdir()
                 self.task_cgroup_path = None
@@ -725,9 +857,23 @@ if sys.platform == "linux":
         parent_cgroup_path = Path(sys.argv[3])
         parent_pid_proc_path = Path(f"/proc/{parent_pid}")
         evt = threading.Event()
-        drekar_launch_process.wait_exit_callback(lambda: evt.set())
+        wake_r, wake_w = os.pipe()
+        def exit_requested():
+            evt.set()
+            with suppress(OSError):
+                os.write(wake_w, b"\0")
+        drekar_launch_process.wait_exit_callback(exit_requested)
+        parent_pidfd = None
+        with suppress(AttributeError, OSError):
+            # pidfd becomes readable as soon as the parent exits, no need to poll /proc
+            parent_pidfd = os.pidfd_open(parent_pid)
         while True:
-            evt.wait(15)
+            if parent_pidfd is not None:
+                ready, _, _ = select.select([parent_pidfd, wake_r], [], [], 15)
+                if parent_pidfd in ready:
+                    break
+            else:
+                evt.wait(15)
             if evt.is_set():
                 break
             if not parent_cgroup_path.exists():
@@ -746,52 +892,66 @@ if sys.platform == "linux":
         _linux_cgroupv2_launch_scope.close_cgroup_path(Path(parent_cgroup_path))
 
 
-def parse_task_launch_from_yaml(yaml_dict, cwd):
+# Default values of optional task fields
+_TASK_DEFAULTS = {
+    "args": None,
+    "restart": False,
+    "restart-backoff": 5,
+    "start-delay": 0,
+    "quit-on-terminate": False,
+}
+
+# Convert task args to a list of strings based on the yaml type
+_ARGS_CONVERTERS = {
+    str: str.split,
+    list: lambda args: [str(a) for a in args],
+    # Corner case where args is another yaml type
+    bool: lambda args: [str(args)],
+    int: lambda args: [str(args)],
+    float: lambda args: [str(args)],
+}
+
+# Matches KEY=VALUE env-file lines, skipping blank lines, lines without "=" and lines starting with "#"
+_ENV_FILE_LINE_RE = re.compile(r"^[^\S\n]*([^#\s=][^=\n]*|)=([^\n]*?)[^\S\n]*$", re.MULTILINE)
+
+@functools.lru_cache(maxsize=256)
+def _which_cached(program, path):
+    # Tasks usually share the same PATH, so only search it once per program
+    return shutil.which(program, path=path)
+
+def parse_task_launch_from_yaml(yaml_dict, cwd, base_env=None):
     # parse yaml_dict into DrekarTask tuple
-    name = yaml_dict["name"]
-    program = yaml_dict["program"]
-    cwd = yaml_dict.get("cwd", cwd)
-    args = yaml_dict.get("args", None)
+    task_dict = {**_TASK_DEFAULTS, **yaml_dict}
+    name = task_dict["name"]
+    program = task_dict["program"]
+    cwd = task_dict.get("cwd", cwd)
+    args = task_dict["args"]
     if args is None:
         args = []
     else:
-        if isinstance(args,str):
-            args = args.split()
-        if isinstance(args,bool) or isinstance(args,int) or isinstance(args,float):
-            # Corner case where args is another yaml type
-            args = [str(args)]
-        else:
-            assert isinstance(args,list), "process args must be a string or list"
-            args = [str(a) for a in args]
-    restart = yaml_dict.get("restart", False)
-    restart_backoff = yaml_dict.get("restart-backoff", 5)
-    tags = yaml_dict.get("tags", [])
-    env = os.environ.copy()
-    env.update(yaml_dict.get("environment", {}))
-    start_delay = yaml_dict.get("start-delay", 0)
-    quit_on_terminate = yaml_dict.get("quit-on-terminate", False)
-
-    if "env-file" in yaml_dict:
-        env_file = yaml_dict["env-file"]
+        args_converter = _ARGS_CONVERTERS.get(type(args), None)
+        assert args_converter is not None, "process args must be a string or list"
+        args = args_converter(args)
+    restart = task_dict["restart"]
+    restart_backoff = task_dict["restart-backoff"]
+    tags = task_dict.get("tags", [])
+    start_delay = task_dict["start-delay"]
+    quit_on_terminate = task_dict["quit-on-terminate"]
+
+    env_file = task_dict.get("env-file", None)
+    if env_file is not None:
         with open(env_file, "r") as f:
-            env = dict()
-            env_line = f.readline()
-            while env_line:
-                env_line = env_line.strip()
-                if env_line:
-                    # handle comments
-                    if env_line[0] == "#":
-                        # remove trailing comment
-                        env_line = env_line.split("#", 1)[0]
-                    env_line_split = env_line.split("=", 1)
-                    if len(env_line_split) == 2:
-                        env[env_line_split[0]] = env_line_split[1]
-                env_line = f.readline()
+            env = dict(_ENV_FILE_LINE_RE.findall(f.read()))
+    else:
+        # base_env is the process environment, copied once for all tasks by the caller
+        env = dict(base_env) if base_env is not None else os.environ.copy()
+        env.update(task_dict.get("environment", {}))
 
     if(Path(program).name == program):
-        program = shutil.which(program, path=env["PATH"])
-        if program is None:
+        program_path = _which_cached(program, env["PATH"])
+        if program_path is None:
             raise Exception("Could not find program: {}".format(program))
+        program = program_path
 
     return DrekarTask(
         name=name,
@@ -810,15 +970,16 @@ def parse_task_launch_from_yaml(yaml_dict, cwd):
 
 
 def parse_task_launches_from_yaml(f, cwd):
-    yaml_dict = yaml.safe_load(f)
+    yaml_dict = yaml.load(f, Loader=_YamlLoader)
     return parse_task_launches_from_yaml_dict(yaml_dict, cwd)
 
 def parse_task_launches_from_yaml_dict(yaml_dict, cwd):
     yaml_tasks = yaml_dict["tasks"]
     name = yaml_dict.get("name",None)
     task_launches = []
+    base_env = os.environ.copy()
     for t in yaml_tasks:
-        task_launches.append(parse_task_launch_from_yaml(t, cwd))
+        task_launches.append(parse_task_launch_from_yaml(t, cwd, base_env))
     return name, task_launches
 
 
@@ -872,7 +1033,6 @@ class DrekarGui:
         self.root.tk.quit()
         # self.root.tk.destroy()
         self.root = None
-        time.sleep(1)
 
     def _close(self, *args):
         self.root.destroy()
@@ -882,26 +1042,95 @@ class DrekarGui:
         self.root.event_generate("<<exit>>")
         self._thread.join()
 
-def parse_task_launches_from_jinja2_config(config, config_fname, cwd, extra_process_args):
-
-    config_absolute_path = os.path.abspath(config_fname)
-    config_dir = os.path.dirname(config_absolute_path)
-    config_text = config.read()
-
-    jinja2_env = jinja2.Environment(
+class _TemplateStreamReader:
+    # File-like adapter so the yaml loader reads rendered output directly from the
+    # template generator instead of from a fully rendered string. Output is encoded
+    # to utf-8 so libyaml can decode it without a Python str copy
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = []
+        self._buffer_len = 0
+
+    def read(self, size=-1):
+        while size < 0 or self._buffer_len < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            chunk = chunk.encode("utf-8")
+            self._buffer.append(chunk)
+            self._buffer_len += len(chunk)
+        data = b"".join(self._buffer)
+        if size >= 0 and len(data) > size:
+            data, rest = data[:size], data[size:]
+            self._buffer = [rest]
+            self._buffer_len = len(rest)
+        else:
+            self._buffer = []
+            self._buffer_len = 0
+        return data
+
+@functools.lru_cache(maxsize=16)
+def _get_jinja2_env(config_dir):
+    # Environments are cached so compiled templates are reused. The bytecode cache
+    # keeps compiled templates between runs
+    # jinja2 and appdirs are imported here so they are only loaded when needed
+    import jinja2
+    import appdirs
+    bytecode_cache = None
+    try:
+        bytecode_cache_dir = Path(appdirs.user_cache_dir(appname="drekar-launch")).joinpath("jinja2")
+        bytecode_cache_dir.mkdir(parents=True, exist_ok=True)
+        bytecode_cache = jinja2.FileSystemBytecodeCache(str(bytecode_cache_dir))
+    except OSError:
+        # The cache dir is not writable, compile templates without the bytecode cache
+        pass
+    return jinja2.Environment(
         loader=jinja2.FileSystemLoader(config_dir),
         undefined=jinja2.StrictUndefined,
         trim_blocks=True,
         lstrip_blocks=True,
+        bytecode_cache=bytecode_cache,
     )
 
+@functools.lru_cache(maxsize=16)
+def _get_jinja2_template(config_dir, config_fname, config_text):
+    # Compile the config text that was already read, using the bytecode cache like
+    # jinja2's loaders do. The loader is only used for includes relative to the config
+    jinja2_env = _get_jinja2_env(config_dir)
+    name = os.path.basename(config_fname)
+    bcc = jinja2_env.bytecode_cache
+    if bcc is None:
+        return jinja2_env.from_string(config_text)
+    bucket = bcc.get_bucket(jinja2_env, name, config_fname, config_text)
+    if bucket.code is None:
+        bucket.code = jinja2_env.compile(config_text, name, config_fname)
+        with suppress(OSError):
+            bcc.set_bucket(bucket)
+    return jinja2_env.template_class.from_code(jinja2_env, bucket.code, jinja2_env.make_globals(None))
+
+def parse_task_launches_from_jinja2_config(config, config_fname, cwd, extra_process_args):
+
+    config_text = config.read()
+    markers = (b"{{", b"{%", b"{#") if isinstance(config_text, bytes) else ("{{", "{%", "{#")
+    if not any(m in config_text for m in markers):
+        # No template markers, so skip jinja2 and parse the config directly
+        yaml_dict = yaml.load(config_text, Loader=_YamlLoader)
+        return parse_task_launches_from_yaml_dict(yaml_dict, cwd)
+
+    config_absolute_path = os.path.abspath(config_fname)
+    config_dir = os.path.dirname(config_absolute_path)
+
+    if isinstance(config_text, bytes):
+        config_text = config_text.decode("utf-8")
+    template = _get_jinja2_template(config_dir, config_absolute_path, config_text)
+
     # create vars from extract args starting with --var-
     vars = dict()
     for a in extra_process_args:
         if a.startswith("--var-"):
-            var_name = a.split("=",1)[0][6:]
-            var_value = a.split("=",1)[1]
-            vars[var_name] = var_value
+            var_name, var_sep, var_value = a[6:].partition("=")
+            if var_sep:
+                vars[var_name] = var_value
 
     extra_args = {
         "configdir": config_dir,
@@ -911,12 +1140,63 @@ def parse_task_launches_from_jinja2_config(config, config_fname, cwd, extra_proc
         "platform": sys.platform
     }
 
-    config_text = jinja2_env.from_string(config_text).render(**extra_args)
-    yaml_dict = yaml.safe_load(config_text)
+    yaml_dict = yaml.load(_TemplateStreamReader(template.generate(**extra_args)), Loader=_YamlLoader)
     name, task_launches = parse_task_launches_from_yaml_dict(yaml_dict, cwd)
 
     return name, task_launches
 
+async def _main_async(name, task_launch, log_dir, screen, gui_enabled):
+    loop = asyncio.get_running_loop()
+    if sys.version_info >= (3, 12):
+        # Let short coroutines complete without a trip through the event loop
+        loop.set_task_factory(asyncio.eager_task_factory)
+    exit_event = asyncio.Event()
+    core = DrekarCore(name, task_launch, exit_event, log_dir, screen, loop)
+    try:
+        gui = None
+        if gui_enabled:
+            gui = DrekarGui(name, core, exit_event)
+            gui.start()
+        if sys.platform == "win32":
+            def ctrl_c_pressed():
+                loop.call_soon_threadsafe(lambda: exit_event.set())
+            drekar_launch_process.wait_exit_callback(ctrl_c_pressed)
+        else:
+            # Deliver signals through the loop wakeup fd instead of a waiter thread
+            loop.add_signal_handler(signal.SIGINT, exit_event.set)
+            loop.add_signal_handler(signal.SIGTERM, exit_event.set)
+        print("Press Ctrl-C to exit")
+        if sys.version_info >= (3, 12):
+            # With eager tasks start_all runs each task up to its first suspension, which
+            # spawns the processes without a start-delay. Skip collections during that burst
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                core.start_all()
+            finally:
+                if gc_enabled:
+                    gc.enable()
+        else:
+            # Older versions only schedule the start tasks here
+            core.start_all()
+        # Objects created so far (modules, parsed config, the core) live for the whole
+        # launch, move them out of the collected generations
+        gc.freeze()
+        await exit_event.wait()
+        print("Exit received, closing")
+        core.stop_all()
+        gc.unfreeze()
+        await core.wait_all_stopped()
+        if gui is not None:
+            gui.close()
+        print("Exiting!")
+        exit_status = core.get_exit_status()
+        if exit_status != 0:
+            print(f"Exit status: {exit_status}")
+        return exit_status
+    finally:
+        core.close()
+
 def main():
 
     # Run the sentinel if requsted on linux
@@ -924,7 +1204,6 @@ def main():
         _sentinel_main()
         return
 
-    core = None
     try:
         parser = argparse.ArgumentParser("PyRI Core Launcher")
         parser.add_argument("--config", type=str, default=None, help="Configuration file")
@@ -943,58 +1222,43 @@ def main():
         
         # check that config or config-j2 is specified
         if parser_results.config_j2 is not None:
-            with open(parser_results.config_j2, "r") as f:                
+            with open(parser_results.config_j2, "rb", buffering=262144) as f:
                 name, task_launch = parse_task_launches_from_jinja2_config(f, parser_results.config_j2, parser_results.cwd, remaining_args)
         elif parser_results.config is not None:
-            with open (parser_results.config, "r") as f:
+            with open(parser_results.config, "rb", buffering=262144) as f:
                 name, task_launch = parse_task_launches_from_yaml(f, parser_results.cwd)
         else:
             # use default config drekar-launch.yaml
-            with open("drekar-launch.yaml", "r") as f:
+            with open("drekar-launch.yaml", "rb", buffering=262144) as f:
                 name, task_launch = parse_task_launches_from_yaml(f, parser_results.cwd)
 
         name = parser_results.name if parser_results.name is not None else name
         if name is None:
             name = "drekar-launch"
 
-        timestamp = datetime.now().strftime("-%Y-%m-%d--%H-%M-%S")
-        log_dir = Path(appdirs.user_log_dir(appname="drekar-launch")).joinpath(name).joinpath(name + timestamp)
+        t = time.localtime()
+        timestamp = f"-{t.tm_year}-{t.tm_mon:02}-{t.tm_mday:02}--{t.tm_hour:02}-{t.tm_min:02}-{t.tm_sec:02}"
+        import appdirs
+        log_dir = Path(appdirs.user_log_dir(appname="drekar-launch"), name, name + timestamp)
         log_dir.mkdir(parents=True, exist_ok=True)
         
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)        
-                        
-        exit_event = asyncio.Event()
-        core = DrekarCore(parser_results.name, task_launch, exit_event, log_dir, not parser_results.quiet, loop)
-        gui = None
-        if parser_results.gui:
-            gui = DrekarGui(name, core, exit_event)
-            gui.start()
-        loop.call_soon(lambda: core.start_all())
-        def ctrl_c_pressed():
-            loop.call_soon_threadsafe(lambda: exit_event.set())
-        drekar_launch_process.wait_exit_callback(ctrl_c_pressed)
-        print("Press Ctrl-C to exit")        
-        loop.run_until_complete(exit_event.wait())
-        print("Exit received, closing")
-        core.stop_all()
-        loop.run_until_complete(core.wait_all_stopped())
-        #pending = asyncio.all_tasks(loop)
-        # pending = asyncio.all_tasks()
-        #loop.run_until_complete(asyncio.gather(*pending))
-        if gui is not None:
-            gui.close()
-        print("Exiting!")
-        exit_status = core.get_exit_status()
-        if exit_status != 0:
-            print(f"Exit status: {exit_status}")
+        main_coro = _main_async(name, task_launch, log_dir, not parser_results.quiet, parser_results.gui)
+        loop_factory = None
+        if sys.platform != "win32" and sys.version_info >= (3, 12):
+            # uvloop is optional, use it if installed for faster subprocess pipe transports.
+            # Windows keeps the proactor loop used by the job object handling
+            with suppress(ImportError):
+                import uvloop
+                loop_factory = uvloop.new_event_loop
+        if loop_factory is not None:
+            with asyncio.Runner(loop_factory=loop_factory) as runner:
+                exit_status = runner.run(main_coro)
+        else:
+            exit_status = asyncio.run(main_coro)
         sys.exit(exit_status)
     except Exception:
         traceback.print_exc()
         raise
-    finally:
-        if core is not None:
-            core.close()
     
 
 
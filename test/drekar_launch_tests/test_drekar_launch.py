@@ -5,86 +5,112 @@ import sys
 import time
 import appdirs
 import shutil
+import functools
+import logging
+import socket
+import select
+from contextlib import suppress
 
-if sys.platform == "win32":
-    import win32gui
-    import win32con
-    import win32process
+_log = logging.getLogger(__name__)
+
+_RES_DIR = Path(__file__).resolve().parent / "res"
 
 def _launch_http_servers():
 
-    # Get current file location
-    res_dir = Path(__file__).parent / "res"
-    proc = subprocess.Popen([sys.executable, "-mdrekar_launch"], cwd=res_dir, close_fds=True,\
+    proc = subprocess.Popen([sys.executable, "-mdrekar_launch"], cwd=_RES_DIR, close_fds=True,\
                              creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if sys.platform == "win32" else 0)
 
     return proc
 
+def _wait_servers_ready(proc, ports, timeout=10):
+    # Poll the test server ports instead of sleeping for a fixed time
+    t_end = time.monotonic() + timeout
+    for port in ports:
+        while True:
+            try:
+                with socket.create_connection(("localhost", port), timeout=0.1):
+                    break
+            except OSError:
+                if time.monotonic() > t_end:
+                    # Shut the launcher down so its servers don't keep holding the ports
+                    _send_shutdown_signal(proc)
+                    with suppress(subprocess.TimeoutExpired):
+                        proc.wait(timeout=10)
+                    _kill_proc_and_fail(proc, f"Test server on port {port} did not start in time")
+                time.sleep(0.05)
+
 def _send_shutdown_signal(proc):
     if sys.platform == "win32":
-        # proc.send_signal(subprocess.signal.CTRL_C_EVENT)
-        # Send WM_CLOSE to the window
-
-        # Find all windows for process proc using pywin32
-        
-
-        windows = []
-        print(proc.pid)
-        # Use FindWindowsEx to find all WM_MESSAGE windows for the process
-        hwnd_child_after = 0
-        while True:
-            hWnd = win32gui.FindWindowEx(win32con.HWND_MESSAGE, hwnd_child_after, None, None)
-            if hWnd == 0:
-                break
-            pid = win32process.GetWindowThreadProcessId(hWnd)[1]
-            if pid == proc.pid:
-                windows.append(hWnd)
-            hwnd_child_after = hWnd
-
-        # Send WM_CLOSE to all windows
-        print(windows)
-        for hwnd in windows:
-            win32gui.PostMessage(hwnd, win32con.WM_CLOSE, 0, 0)
-    
-        proc.send_signal(subprocess.signal.CTRL_C_EVENT)
+        # The launcher was started with CREATE_NEW_PROCESS_GROUP, so CTRL_BREAK_EVENT
+        # reaches its console control handler directly
+        proc.send_signal(subprocess.signal.CTRL_BREAK_EVENT)
     else:
         proc.send_signal(subprocess.signal.SIGINT)
 
 def _wait_proc_exit(proc):
+    if hasattr(os, "pidfd_open"):
+        # Wait on a pidfd so exit is noticed immediately instead of by wait() polling
+        try:
+            pidfd = os.pidfd_open(proc.pid)
+        except OSError:
+            pidfd = None
+        if pidfd is not None:
+            try:
+                poller = select.poll()
+                poller.register(pidfd, select.POLLIN)
+                if not poller.poll(10000):
+                    _kill_proc_and_fail(proc, "Process did not exit in time")
+            finally:
+                os.close(pidfd)
     try:
         proc.wait(timeout=10)
     except subprocess.TimeoutExpired:
-        assert False, "Process did not exit in time"
+        _kill_proc_and_fail(proc, "Process did not exit in time")
+
+def _kill_proc_and_fail(proc, msg):
+    # Don't leave the launcher running after a failure. Its tasks are in win32
+    # job objects closed on exit, or in a cgroup removed by the launcher sentinel
+    proc.kill()
+    proc.wait()
+    assert False, msg
         
 
 def _assert_proc_returncode(proc):
     assert proc.returncode == 0, f"Process return code is {proc.returncode}"
 
+@functools.lru_cache(maxsize=None)
 def _get_logdir_base(name):
     log_dir = Path(appdirs.user_log_dir(appname="drekar-launch")).joinpath(name)
-    print("Log dir is ", log_dir)
+    _log.debug("Log dir is %s", log_dir)
     return log_dir
 
 def _clear_logs(name):
-    # Clear logs
+    # The whole base directory belongs to the test. Try a plain rmdir first, which is
+    # enough when it is missing or empty
     basedir = _get_logdir_base(name)
-    if basedir.exists():
-        # glob for name
-        for f in basedir.glob(f"{name}*"):
-            print("Removing old test log file ", f)
-            shutil.rmtree(f)
+    _log.debug("Removing old test log directory %s", basedir)
+    try:
+        os.rmdir(basedir)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        shutil.rmtree(basedir)
 
 def _assert_logs_exist(name):
     basedir = _get_logdir_base(name)
     if not basedir.exists():
         assert False, f"Log dir {basedir} does not exist"
-    # glob for name
-    for f in basedir.glob(f"{name}*"):
-        print("Found test log directory ", f)
-        assert (f / "test_http_server_1.log").is_file(), "test_http_server_1.log does not exist"
-        assert (f / "test_http_server_1.stderr.log").is_file(), "test_http_server_1.stderr.log does not exist"
-        assert (f / "test_http_server_2.log").is_file(), "test_http_server_2.log does not exist"
-        assert (f / "test_http_server_2.stderr.log").is_file(), "test_http_server_2.stderr.log does not exist"
+    # The log file names are known, so probe them directly instead of listing the run directory
+    with os.scandir(basedir) as it:
+        log_dirs = [e.path for e in it if e.name.startswith(name) and e.is_dir()]
+    for f in log_dirs:
+        _log.debug("Found test log directory %s", f)
+        for log_fname in ("test_http_server_1.log", "test_http_server_1.stderr.log",
+                          "test_http_server_2.log", "test_http_server_2.stderr.log"):
+            try:
+                os.stat(os.path.join(f, log_fname))
+            except FileNotFoundError:
+                assert False, f"{log_fname} does not exist"
         return
         
     assert False
@@ -93,9 +119,7 @@ def test_services():
     _clear_logs("test_drekar_launch")
     launch_proc = _launch_http_servers()
 
-    # TODO: check servers status
-
-    time.sleep(5)
+    _wait_servers_ready(launch_proc, [8210, 8211])
 
     _send_shutdown_signal(launch_proc)
     print("Sent shutdown")
@@ -2,19 +2,35 @@ import subprocess
 import sys
 import os
 from pathlib import Path
+import pytest
 
-def test_drekar_launch_quit():
-    res_dir = Path(__file__).parent / "res"
-    subprocess.check_call([sys.executable, "-mdrekar_launch", "--config=drekar-launch-quit.yaml"],
-                          cwd=res_dir, close_fds=True)
+_RES_DIR = Path(__file__).resolve().parent / "res"
+
+# The quit configurations use separate ports and log names, so they are run concurrently
+_QUIT_LAUNCH_ARGS = {
+    "quit": ["--config=drekar-launch-quit.yaml", "--name=test_drekar_launch_quit"],
+    "quit_j2": ["--config-j2=drekar-launch-quit-j2.yaml.j2", "--name=test_drekar_launch_quit_j2"],
+    "quit_err": ["--config=drekar-launch-quit-err.yaml", "--name=test_drekar_launch_quit_err"],
+}
+
+@pytest.fixture(scope="module")
+def quit_procs():
+    procs = {k: subprocess.Popen([sys.executable, "-mdrekar_launch"] + args, cwd=_RES_DIR, close_fds=True)
+             for k, args in _QUIT_LAUNCH_ARGS.items()}
+    yield procs
+    for proc in procs.values():
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+def test_drekar_launch_quit(quit_procs):
+    res = quit_procs["quit"].wait()
+    assert res == 0, "Expected return code 0, got " + str(res)
     
-def test_drekar_launch_quit_j2():
-    res_dir = Path(__file__).parent / "res"
-    subprocess.check_call([sys.executable, "-mdrekar_launch", "--config-j2=drekar-launch-quit-j2.yaml.j2"],
-                          cwd=res_dir, close_fds=True)
+def test_drekar_launch_quit_j2(quit_procs):
+    res = quit_procs["quit_j2"].wait()
+    assert res == 0, "Expected return code 0, got " + str(res)
 
-def test_drekar_launch_quit_err():
-    res_dir = Path(__file__).parent / "res"
-    res = subprocess.call([sys.executable, "-mdrekar_launch", "--config=drekar-launch-quit-err.yaml"],
-                          cwd=res_dir, close_fds=True)
+def test_drekar_launch_quit_err(quit_procs):
+    res = quit_procs["quit_err"].wait()
     assert res == 42, "Expected return code 42, got " + str(res)
\ No newline at end of file